@@ -1,20 +1,36 @@
-from typing import List, Optional, Dict, Any
+import base64
+from collections import defaultdict
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Tuple
+from uuid import UUID
 from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlalchemy import func
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from sqlalchemy import DateTime, Float, Integer, Select, String, bindparam, func, select, tuple_
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.engine import RowMapping
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
 from fastapi.middleware.cors import CORSMiddleware
 
 import httpx
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import Response
-from starlette.background import BackgroundTask
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 import urllib.parse
 
-from database import SessionLocal
+from fastapi_cache.decorator import cache
+
+from cache import init_cache, query_key_builder, get_cached_image, set_cached_image
+from database import AsyncSessionLocal
 from models import Product, Store, Pricing
 
-app = FastAPI(title="Monitor Price Comparison API")
+app = FastAPI(title="Monitor Price Comparison API", default_response_class=ORJSONResponse)
+
+# Shared client for /proxy-image/ so upstream connections (and TLS sessions) are reused
+http_client = httpx.AsyncClient(http2=True, limits=httpx.Limits(max_connections=100))
+
+# Images up to this size are buffered while streaming so they can be cached
+MAX_CACHED_IMAGE_SIZE = 512 * 1024
 
 # Add CORS middleware
 app.add_middleware(
@@ -23,97 +39,240 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Next-Cursor"],  # Let browser clients read the pagination cursor
 )
 
 
+@app.on_event("startup")
+async def startup():
+    init_cache()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await http_client.aclose()
+
+
 # Database dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 # Pydantic models for API responses
 class StoreModel(BaseModel):
-    id: str
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
     name: str
     website: str
 
-    class Config:
-        orm_mode = True
-
 
 class PricingModel(BaseModel):
-    id: str
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
     price: float
-    stock_status: Optional[str]
+    stock_status: Optional[str] = None
     url: str
-    last_updated: Optional[str]
+    last_updated: Optional[datetime] = None
     store: StoreModel
 
-    class Config:
-        orm_mode = True
-
 
 class ProductSpecsModel(BaseModel):
-    size: Optional[float]
-    resolution: Optional[str]
-    refresh_rate: Optional[float]
-    panel_type: Optional[str]
-    curved: Optional[bool]
-    gaming: Optional[bool]
-    hdr: Optional[bool]
-    freesync: Optional[bool]
-    gsync: Optional[bool]
-    usb_c: Optional[bool]
-    hdmi: Optional[bool]
-    displayport: Optional[bool]
-    speakers: Optional[bool]
-    height_adjustable: Optional[bool]
-
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+    size: Optional[float] = None
+    resolution: Optional[str] = None
+    refresh_rate: Optional[float] = None
+    panel_type: Optional[str] = None
+    curved: Optional[bool] = None
+    gaming: Optional[bool] = None
+    hdr: Optional[bool] = None
+    freesync: Optional[bool] = None
+    gsync: Optional[bool] = None
+    usb_c: Optional[bool] = None
+    hdmi: Optional[bool] = None
+    displayport: Optional[bool] = None
+    speakers: Optional[bool] = None
+    height_adjustable: Optional[bool] = None
 
 
 class ProductModel(BaseModel):
-    id: str
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
     name: str
     brand: str
     model: str
     category: str
-    specs: Optional[Dict[str, Any]]
-    size: Optional[float]
-    resolution: Optional[str]
-    refresh_rate: Optional[float]
-    panel_type: Optional[str]
-    image_url: Optional[str]
-    prices: List[PricingModel]
-
-    class Config:
-        orm_mode = True
+    specs: Optional[Dict[str, Any]] = None
+    size: Optional[float] = None
+    resolution: Optional[str] = None
+    refresh_rate: Optional[float] = None
+    panel_type: Optional[str] = None
+    image_url: Optional[str] = None
+    # Read from the Product.pricing relationship when validating ORM objects
+    prices: List[PricingModel] = Field(validation_alias=AliasChoices("prices", "pricing"))
 
 
 class ProductComparisonModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     product: ProductModel
-    best_price: Optional[PricingModel]
-    price_difference: Optional[float]
+    best_price: Optional[PricingModel] = None
+    price_difference: Optional[float] = None
 
-    class Config:
-        orm_mode = True
+
+def store_to_dict(store: Store) -> Dict[str, Any]:
+    return {
+        # asyncpg returns its own UUID subclass, which orjson refuses to serialize
+        "id": str(store.id),
+        "name": store.name,
+        "website": store.website
+    }
+
+
+def with_pricing():
+    """Loader option that fetches pricing and stores in bulk instead of per product"""
+    return selectinload(Product.pricing).joinedload(Pricing.store)
+
+
+@cache(expire=300, namespace="stores", key_builder=query_key_builder)
+async def load_stores(*, db: AsyncSession) -> Dict[str, Dict[str, Any]]:
+    """All stores keyed by the string form of their id (the cached value is JSON)"""
+    stores = await db.scalars(select(Store))
+    return {str(store.id): store_to_dict(store) for store in stores}
+
+
+# Product columns returned by the list endpoints
+PRODUCT_COLUMNS = (
+    Product.id, Product.name, Product.brand, Product.model, Product.category, Product.specs,
+    Product.size, Product.resolution, Product.refresh_rate, Product.panel_type, Product.image_url,
+)
+
+
+async def fetch_product_rows(
+        db: AsyncSession, page: Select, params: Optional[Dict[str, Any]] = None, in_stock_only: bool = False
+) -> Tuple[List[Dict[str, Any]], Optional[RowMapping]]:
+    """
+    Run a page query over PRODUCT_COLUMNS, then load the prices of the whole page with a
+    single product_id IN (...) query, skipping ORM objects and response model validation.
+    Ids and dates are returned as strings: asyncpg's UUID type is not serializable by orjson,
+    and the /products/ response cache must hold plain JSON values.
+    Returns the products and the last row of the page.
+    """
+    rows = (await db.execute(page, params)).mappings().all()
+    if not rows:
+        return [], None
+
+    # Stores are a handful of rows; resolve them from a cached dict instead of
+    # joining and repeating the store columns on every pricing row
+    stores = await load_stores(db=db)
+
+    pricing_stmt = select(
+        Pricing.id,
+        Pricing.product_id,
+        Pricing.price,
+        Pricing.stock_status,
+        Pricing.url,
+        Pricing.last_updated,
+        Pricing.store_id,
+    ).where(Pricing.product_id.in_([row["id"] for row in rows]))
+    if in_stock_only:
+        pricing_stmt = pricing_stmt.where(Pricing.stock_status.ilike("%in stock%"))
+
+    prices_by_product = defaultdict(list)
+    for pricing in (await db.execute(pricing_stmt)).mappings():
+        store_key = str(pricing["store_id"])
+        store = stores.get(store_key)
+        if store is None:
+            # Store created after the cached dict was built
+            store = stores[store_key] = store_to_dict(await db.get(Store, pricing["store_id"]))
+        prices_by_product[pricing["product_id"]].append({
+            "id": str(pricing["id"]),
+            "price": pricing["price"],
+            "stock_status": pricing["stock_status"],
+            "url": pricing["url"],
+            # As a string, so the cached page decodes to the same JSON instead of pendulum dates
+            "last_updated": pricing["last_updated"].isoformat() if pricing["last_updated"] else None,
+            "store": store
+        })
+
+    products = []
+    for row in rows:
+        product = {column.key: row[column.key] for column in PRODUCT_COLUMNS}
+        product["id"] = str(row["id"])
+        product["prices"] = prices_by_product[row["id"]]
+        products.append(product)
+
+    return products, rows[-1]
+
+
+@lru_cache(maxsize=None)
+def product_page_statement(filters: Tuple[str, ...]) -> Select:
+    """
+    The /products/ page query for a combination of active filters, with bound parameters
+    in place of the filter values. Each combination is built once and the same statement
+    object is reused, so requests skip rebuilding the query and recomputing its cache key
+    before SQLAlchemy's compiled cache (and asyncpg's prepared statements) kick in.
+    """
+    stmt = select(*PRODUCT_COLUMNS, Product.created_at)
+
+    if "brand" in filters:
+        stmt = stmt.where(Product.brand.ilike(bindparam("brand", type_=String)))
+    if "min_size" in filters:
+        stmt = stmt.where(Product.size >= bindparam("min_size", type_=Float))
+    if "max_size" in filters:
+        stmt = stmt.where(Product.size <= bindparam("max_size", type_=Float))
+    if "min_refresh_rate" in filters:
+        stmt = stmt.where(Product.refresh_rate >= bindparam("min_refresh_rate", type_=Float))
+    if "panel_type" in filters:
+        stmt = stmt.where(Product.panel_type.ilike(bindparam("panel_type", type_=String)))
+    if "resolution" in filters:
+        stmt = stmt.where(Product.resolution == bindparam("resolution", type_=String))
+    if "in_stock" in filters:
+        # Only products with at least one in-stock offer
+        stmt = stmt.where(Product.pricing.any(Pricing.stock_status.ilike("%in stock%")))
+    if "cursor" in filters:
+        # Keyset pagination: continue right after the last row of the previous page
+        stmt = stmt.where(tuple_(Product.created_at, Product.id) < tuple_(
+            bindparam("cursor_created_at", type_=DateTime),
+            bindparam("cursor_id", type_=PG_UUID(as_uuid=True))
+        ))
+
+    return stmt \
+        .order_by(Product.created_at.desc(), Product.id.desc()) \
+        .limit(bindparam("limit", type_=Integer))
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode the sort key of the last returned row into an opaque page cursor"""
+    raw = "|".join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, *types) -> Tuple[Any, ...]:
+    """Decode a cursor produced by encode_cursor, converting each field with the given types"""
+    try:
+        parts = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if len(parts) != len(types):
+            raise ValueError("Unexpected number of cursor fields")
+        return tuple(cast(part) for cast, part in zip(types, parts))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @app.get("/", tags=["Health"])
-def read_root():
+async def read_root():
     return {"message": "Monitor Price Comparison API is running"}
 
 
-@app.get("/products/", response_model=List[ProductModel], tags=["Products"])
-def get_products(
-        db: Session = Depends(get_db),
-        skip: int = 0,
-        limit: int = 100,
+@app.get("/products/", responses={200: {"model": List[ProductModel]}}, tags=["Products"])
+async def get_products(
+        db: AsyncSession = Depends(get_db),
+        cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+        limit: int = Query(100, ge=1),
         brand: Optional[str] = None,
         min_size: Optional[float] = None,
         max_size: Optional[float] = None,
@@ -123,382 +282,248 @@ def get_products(
         in_stock: Optional[bool] = None,
 ):
     """
-    Get a list of products with optional filtering
+    Get a list of products with optional filtering, newest first.
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    page = await list_products(
+        db=db, cursor=cursor, limit=limit, brand=brand, min_size=min_size, max_size=max_size,
+        min_refresh_rate=min_refresh_rate, panel_type=panel_type, resolution=resolution, in_stock=in_stock
+    )
+    headers = {"X-Next-Cursor": page["next_cursor"]} if page["next_cursor"] else None
+    return ORJSONResponse(page["products"], headers=headers)
+
+
+@cache(expire=60, namespace="products", key_builder=query_key_builder)
+async def list_products(
+        *,
+        db: AsyncSession,
+        cursor: Optional[str],
+        limit: int,
+        brand: Optional[str],
+        min_size: Optional[float],
+        max_size: Optional[float],
+        min_refresh_rate: Optional[float],
+        panel_type: Optional[str],
+        resolution: Optional[str],
+        in_stock: Optional[bool],
+) -> Dict[str, Any]:
+    """
+    Fetch one page of products together with the cursor of the next page.
+    Kept apart from the endpoint so the cached value includes the cursor.
     """
-    query = db.query(Product)
-
     # Apply filters
-    if brand:
-        query = query.filter(Product.brand.ilike(f"%{brand}%"))
-    if min_size:
-        query = query.filter(Product.size >= min_size)
-    if max_size:
-        query = query.filter(Product.size <= max_size)
-    if min_refresh_rate:
-        query = query.filter(Product.refresh_rate >= min_refresh_rate)
-    if panel_type:
-        query = query.filter(Product.panel_type.ilike(f"%{panel_type}%"))
-    if resolution:
-        query = query.filter(Product.resolution == resolution)
-
-    # Get products with pagination
-    products = query.offset(skip).limit(limit).all()
-
-    # Process results
-    result = []
-    for product in products:
-        # Get all pricing for this product
-        pricing_query = db.query(Pricing).filter(Pricing.product_id == product.id)
-
-        # Apply in_stock filter if requested
-        if in_stock:
-            pricing_query = pricing_query.filter(Pricing.stock_status.ilike("%in stock%"))
-
-        pricing_list = pricing_query.all()
-
-        # Skip products with no pricing if in_stock filter is applied
-        if in_stock and not pricing_list:
-            continue
-
-        # Create a product model with pricing information
-        product_dict = {
-            "id": product.id,
-            "name": product.name,
-            "brand": product.brand,
-            "model": product.model,
-            "category": product.category,
-            "specs": product.specs,
-            "size": product.size,
-            "resolution": product.resolution,
-            "refresh_rate": product.refresh_rate,
-            "panel_type": product.panel_type,
-            "image_url": product.image_url,
-            "prices": []
-        }
-
-        # Add pricing information
-        for pricing in pricing_list:
-            store = db.query(Store).filter(Store.id == pricing.store_id).first()
-            pricing_dict = {
-                "id": pricing.id,
-                "price": pricing.price,
-                "stock_status": pricing.stock_status,
-                "url": pricing.url,
-                "last_updated": pricing.last_updated.isoformat() if pricing.last_updated else None,
-                "store": {
-                    "id": store.id,
-                    "name": store.name,
-                    "website": store.website
-                }
-            }
-            product_dict["prices"].append(pricing_dict)
-
-        result.append(product_dict)
+    params = {
+        "brand": f"%{brand}%" if brand else None,
+        "min_size": min_size,
+        "max_size": max_size,
+        "min_refresh_rate": min_refresh_rate,
+        "panel_type": f"%{panel_type}%" if panel_type else None,
+        "resolution": resolution,
+    }
+    params = {name: value for name, value in params.items() if value}
+    filters = list(params)
+    if in_stock:
+        filters.append("in_stock")
+    if cursor:
+        params["cursor_created_at"], params["cursor_id"] = decode_cursor(cursor, datetime.fromisoformat, UUID)
+        filters.append("cursor")
+    params["limit"] = limit
+
+    page = product_page_statement(tuple(filters))
+    products, last = await fetch_product_rows(db, page, params, in_stock_only=bool(in_stock))
+
+    next_cursor = None
+    if len(products) == limit:
+        next_cursor = encode_cursor(last["created_at"].isoformat(), last["id"])
 
-    return result
+    return {
+        "products": products,
+        "next_cursor": next_cursor
+    }
 
 
 @app.get("/products/{product_id}", response_model=ProductModel, tags=["Products"])
-def get_product(product_id: str, db: Session = Depends(get_db)):
+async def get_product(product_id: UUID, db: AsyncSession = Depends(get_db)):
     """
     Get detailed information about a specific product
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    stmt = select(Product) \
+        .options(with_pricing()) \
+        .where(Product.id == product_id)
+    product = (await db.execute(stmt)).scalars().first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    # Get all pricing for this product
-    pricing_list = db.query(Pricing).filter(Pricing.product_id == product.id).all()
-
-    # Create a product model with pricing information
-    product_dict = {
-        "id": product.id,
-        "name": product.name,
-        "brand": product.brand,
-        "model": product.model,
-        "category": product.category,
-        "specs": product.specs,
-        "size": product.size,
-        "resolution": product.resolution,
-        "refresh_rate": product.refresh_rate,
-        "panel_type": product.panel_type,
-        "image_url": product.image_url,
-        "prices": []
-    }
-
-    # Add pricing information
-    for pricing in pricing_list:
-        store = db.query(Store).filter(Store.id == pricing.store_id).first()
-        pricing_dict = {
-            "id": pricing.id,
-            "price": pricing.price,
-            "stock_status": pricing.stock_status,
-            "url": pricing.url,
-            "last_updated": pricing.last_updated.isoformat() if pricing.last_updated else None,
-            "store": {
-                "id": store.id,
-                "name": store.name,
-                "website": store.website
-            }
-        }
-        product_dict["prices"].append(pricing_dict)
-
-    return product_dict
+    return ProductModel.model_validate(product)
 
 
 @app.get("/compare/{product_id}", response_model=ProductComparisonModel, tags=["Comparison"])
-def compare_product_prices(product_id: str, db: Session = Depends(get_db)):
+async def compare_product_prices(product_id: UUID, db: AsyncSession = Depends(get_db)):
     """
     Compare prices for a specific product across different stores
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    stmt = select(Product) \
+        .options(with_pricing()) \
+        .where(Product.id == product_id)
+    product = (await db.execute(stmt)).scalars().first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    # Get all pricing for this product
-    pricing_list = db.query(Pricing).filter(Pricing.product_id == product.id).all()
-
-    if not pricing_list:
+    if not product.pricing:
         raise HTTPException(status_code=404, detail="No pricing information found for this product")
 
-    # Create a product model with pricing information
-    product_dict = {
-        "id": product.id,
-        "name": product.name,
-        "brand": product.brand,
-        "model": product.model,
-        "category": product.category,
-        "specs": product.specs,
-        "size": product.size,
-        "resolution": product.resolution,
-        "refresh_rate": product.refresh_rate,
-        "panel_type": product.panel_type,
-        "image_url": product.image_url,
-        "prices": []
-    }
+    # Cheapest in-stock offer and the overall price spread in one aggregate
+    in_stock = Pricing.stock_status.ilike("%in stock%")
+    prices = (await db.execute(
+        select(
+            func.min(Pricing.price).filter(in_stock).label("min_in_stock"),
+            func.max(Pricing.price).label("max_any")
+        ).where(Pricing.product_id == product_id)
+    )).one()
 
-    # Find the best (lowest) price
     best_price = None
-    min_price = float('inf')
-
-    # Process pricing information
-    for pricing in pricing_list:
-        store = db.query(Store).filter(Store.id == pricing.store_id).first()
-        pricing_dict = {
-            "id": pricing.id,
-            "price": pricing.price,
-            "stock_status": pricing.stock_status,
-            "url": pricing.url,
-            "last_updated": pricing.last_updated.isoformat() if pricing.last_updated else None,
-            "store": {
-                "id": store.id,
-                "name": store.name,
-                "website": store.website
-            }
-        }
-        product_dict["prices"].append(pricing_dict)
-
-        # Update best price if this is lower
-        if pricing.price < min_price and pricing.stock_status and "in stock" in pricing.stock_status.lower():
-            min_price = pricing.price
-            best_price = pricing_dict
-
-    # Calculate price difference (max - min)
-    max_price = max(p.price for p in pricing_list)
-    price_difference = max_price - min_price if min_price != float('inf') else 0
-
-    return {
-        "product": product_dict,
-        "best_price": best_price,
-        "price_difference": price_difference
-    }
+    price_difference = 0
+    if prices.min_in_stock is not None:
+        best_stmt = select(Pricing) \
+            .options(joinedload(Pricing.store)) \
+            .where(Pricing.product_id == product_id, Pricing.price == prices.min_in_stock, in_stock) \
+            .limit(1)
+        best_pricing = (await db.execute(best_stmt)).scalars().first()
+        best_price = PricingModel.model_validate(best_pricing)
+        price_difference = prices.max_any - prices.min_in_stock
+
+    return ProductComparisonModel(
+        product=ProductModel.model_validate(product),
+        best_price=best_price,
+        price_difference=price_difference
+    )
 
 
 @app.get("/brands/", response_model=List[str], tags=["Filters"])
-def get_brands(db: Session = Depends(get_db)):
+@cache(expire=300, namespace="brands", key_builder=query_key_builder)
+async def get_brands(db: AsyncSession = Depends(get_db)):
     """
     Get a list of all available brands
     """
-    brands = db.query(Product.brand).distinct().all()
-    return [brand[0] for brand in brands]
+    brands = await db.scalars(select(Product.brand).distinct())
+    return brands.all()
 
 
 @app.get("/stores/", response_model=List[StoreModel], tags=["Filters"])
-def get_stores(db: Session = Depends(get_db)):
+async def get_stores(db: AsyncSession = Depends(get_db)):
     """
     Get a list of all available stores
     """
-    stores = db.query(Store).all()
-    return stores
+    stores = await load_stores(db=db)
+    return list(stores.values())
 
 
-@app.get("/search/", response_model=List[ProductModel], tags=["Search"])
-def search_products(
+@app.get("/search/", responses={200: {"model": List[ProductModel]}}, tags=["Search"])
+async def search_products(
         query: str,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         limit: int = 10
 ):
     """
     Search for products by name, brand, or model
     """
     search_term = f"%{query}%"
-    products = db.query(Product).filter(
+    # Full-text match on the GIN-indexed search vector finds the query words in any order;
+    # the trigram-indexed ILIKEs keep matching substrings inside words (e.g. partial models)
+    page = select(*PRODUCT_COLUMNS).where(
+        (Product.search_vec.op("@@")(func.plainto_tsquery("simple", query))) |
         (Product.name.ilike(search_term)) |
         (Product.brand.ilike(search_term)) |
         (Product.model.ilike(search_term))
-    ).limit(limit).all()
-
-    # Process results
-    result = []
-    for product in products:
-        # Get all pricing for this product
-        pricing_list = db.query(Pricing).filter(Pricing.product_id == product.id).all()
-
-        # Create a product model with pricing information
-        product_dict = {
-            "id": product.id,
-            "name": product.name,
-            "brand": product.brand,
-            "model": product.model,
-            "category": product.category,
-            "specs": product.specs,
-            "size": product.size,
-            "resolution": product.resolution,
-            "refresh_rate": product.refresh_rate,
-            "panel_type": product.panel_type,
-            "image_url": product.image_url,
-            "prices": []
-        }
+    ).limit(limit)
+    products, _ = await fetch_product_rows(db, page)
 
-        # Add pricing information
-        for pricing in pricing_list:
-            store = db.query(Store).filter(Store.id == pricing.store_id).first()
-            pricing_dict = {
-                "id": pricing.id,
-                "price": pricing.price,
-                "stock_status": pricing.stock_status,
-                "url": pricing.url,
-                "last_updated": pricing.last_updated.isoformat() if pricing.last_updated else None,
-                "store": {
-                    "id": store.id,
-                    "name": store.name,
-                    "website": store.website
-                }
-            }
-            product_dict["prices"].append(pricing_dict)
-
-        result.append(product_dict)
-
-    return result
-
-
-@app.get("/products/multi-store/", response_model=List[ProductModel], tags=["Products"])
-def get_multi_store_products(
-        db: Session = Depends(get_db),
+    return ORJSONResponse(products)
+
+
+@app.get("/products/multi-store/", responses={200: {"model": List[ProductModel]}}, tags=["Products"])
+async def get_multi_store_products(
+        db: AsyncSession = Depends(get_db),
         min_stores: int = Query(2, description="Minimum number of stores selling the product"),
-        skip: int = 0,
-        limit: int = 100
+        cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+        limit: int = Query(100, ge=1)
 ):
     """
-    Get products that are available in multiple stores (for price comparison)
+    Get products that are available in multiple stores (for price comparison).
+    The cursor for the next page is returned in the X-Next-Cursor header.
     """
     # Find product IDs with multiple stores
-    subquery = db.query(Pricing.product_id, func.count(Pricing.store_id).label("store_count")) \
+    # (store_id is NOT NULL, so count(*) is equivalent and avoids reading the column)
+    subquery = select(Pricing.product_id, func.count().label("store_count")) \
         .group_by(Pricing.product_id) \
-        .having(func.count(Pricing.store_id) >= min_stores) \
+        .having(func.count() >= min_stores) \
         .subquery()
 
     # Get the actual products
-    products_query = db.query(Product) \
-        .join(subquery, Product.id == subquery.c.product_id) \
-        .order_by(subquery.c.store_count.desc()) \
-        .offset(skip) \
+    stmt = select(*PRODUCT_COLUMNS, subquery.c.store_count) \
+        .join(subquery, Product.id == subquery.c.product_id)
+
+    # Keyset pagination on (store_count, product_id)
+    if cursor:
+        store_count, last_id = decode_cursor(cursor, int, UUID)
+        stmt = stmt.where(
+            tuple_(subquery.c.store_count, subquery.c.product_id) < tuple_(store_count, last_id)
+        )
+
+    page = stmt \
+        .order_by(subquery.c.store_count.desc(), subquery.c.product_id.desc()) \
         .limit(limit)
+    products, last = await fetch_product_rows(db, page)
 
-    products = products_query.all()
-
-    # Process results
-    result = []
-    for product in products:
-        # Get all pricing for this product
-        pricing_list = db.query(Pricing).filter(Pricing.product_id == product.id).all()
-
-        # Create a product model with pricing information
-        product_dict = {
-            "id": product.id,
-            "name": product.name,
-            "brand": product.brand,
-            "model": product.model,
-            "category": product.category,
-            "specs": product.specs,
-            "size": product.size,
-            "resolution": product.resolution,
-            "refresh_rate": product.refresh_rate,
-            "panel_type": product.panel_type,
-            "image_url": product.image_url,
-            "prices": []
-        }
-
-        # Add pricing information
-        for pricing in pricing_list:
-            store = db.query(Store).filter(Store.id == pricing.store_id).first()
-            pricing_dict = {
-                "id": pricing.id,
-                "price": pricing.price,
-                "stock_status": pricing.stock_status,
-                "url": pricing.url,
-                "last_updated": pricing.last_updated.isoformat() if pricing.last_updated else None,
-                "store": {
-                    "id": store.id,
-                    "name": store.name,
-                    "website": store.website
-                }
-            }
-            product_dict["prices"].append(pricing_dict)
+    headers = None
+    if len(products) == limit:
+        headers = {"X-Next-Cursor": encode_cursor(last["store_count"], last["id"])}
 
-        result.append(product_dict)
-
-    return result
+    return ORJSONResponse(products, headers=headers)
 
 
 @app.get("/stats/", tags=["Statistics"])
-def get_stats(db: Session = Depends(get_db)):
+@cache(expire=300, namespace="stats", key_builder=query_key_builder)
+async def get_stats(db: AsyncSession = Depends(get_db)):
     """
     Get general statistics about the database
     """
     # Count total products
-    product_count = db.query(Product).count()
+    product_count = await db.scalar(select(func.count()).select_from(Product))
 
     # Count products by brand
-    brand_counts = db.query(Product.brand, func.count(Product.id)) \
-        .group_by(Product.brand) \
-        .order_by(func.count(Product.id).desc()) \
-        .all()
+    brand_counts = await db.execute(
+        select(Product.brand, func.count(Product.id))
+        .group_by(Product.brand)
+        .order_by(func.count(Product.id).desc())
+    )
 
     brand_stats = {brand: count for brand, count in brand_counts}
 
     # Count products by store
-    from sqlalchemy import func
-    store_counts = db.query(Store.name, func.count(Pricing.id)) \
-        .join(Pricing, Store.id == Pricing.store_id) \
-        .group_by(Store.name) \
-        .all()
+    store_counts = await db.execute(
+        select(Store.name, func.count(Pricing.id))
+        .join(Pricing, Store.id == Pricing.store_id)
+        .group_by(Store.name)
+    )
 
     store_stats = {store: count for store, count in store_counts}
 
-    # Count products with multiple stores
-    multi_store_products = db.query(Product.id) \
-        .join(Pricing, Product.id == Pricing.product_id) \
-        .group_by(Product.id) \
-        .having(func.count(Pricing.store_id) > 1) \
-        .count()
+    # Count products with multiple stores, grouping pricing on its indexed product_id only
+    multi_store_subquery = select(Pricing.product_id) \
+        .group_by(Pricing.product_id) \
+        .having(func.count() > 1) \
+        .subquery()
+    multi_store_products = await db.scalar(select(func.count()).select_from(multi_store_subquery))
 
     # Get price range statistics
-    price_stats = db.query(
-        func.min(Pricing.price),
-        func.avg(Pricing.price),
-        func.max(Pricing.price)
-    ).first()
+    price_stats = (await db.execute(
+        select(
+            func.min(Pricing.price),
+            func.avg(Pricing.price),
+            func.max(Pricing.price)
+        )
+    )).first()
 
     return {
         "total_products": product_count,
@@ -519,29 +544,49 @@ async def proxy_image(url: str):
     Proxy an image from any URL through the backend to avoid CORS issues.
     Usage: /proxy-image/?url=https://www.anhoch.com/storage/media/image.jpg
     """
-    try:
-        # URL decode the parameter
-        decoded_url = urllib.parse.unquote(url)
+    # URL decode the parameter
+    decoded_url = urllib.parse.unquote(url)
 
-        # Use httpx to get the image
-        async with httpx.AsyncClient() as client:
-            response = await client.get(decoded_url)
+    cached = await get_cached_image(decoded_url)
+    if cached:
+        content, content_type = cached
+        return Response(content=content, media_type=content_type)
 
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch image")
-
-            # Get the content type or default to image/jpeg
-            content_type = response.headers.get("content-type", "image/jpeg")
-
-            # Return the image data with the correct content type
-            return Response(
-                content=response.content,
-                media_type=content_type,
-                background=BackgroundTask(response.aclose)
-            )
+    try:
+        request = http_client.build_request("GET", decoded_url)
+        upstream = await http_client.send(request, stream=True)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error proxying image: {str(e)}")
 
+    if upstream.status_code != 200:
+        await upstream.aclose()
+        raise HTTPException(status_code=upstream.status_code, detail="Failed to fetch image")
+
+    # Get the content type or default to image/jpeg
+    content_type = upstream.headers.get("content-type", "image/jpeg")
+
+    async def forward_image():
+        """Forward the image chunk by chunk, keeping a copy of small images for the cache"""
+        chunks = []
+        size = 0
+        try:
+            async for chunk in upstream.aiter_bytes(65536):
+                yield chunk
+                if chunks is not None:
+                    size += len(chunk)
+                    if size <= MAX_CACHED_IMAGE_SIZE:
+                        chunks.append(chunk)
+                    else:
+                        # Too large to cache, stop holding on to it
+                        chunks = None
+        finally:
+            await upstream.aclose()
+
+        if chunks is not None:
+            await set_cached_image(decoded_url, b"".join(chunks), content_type)
+
+    return StreamingResponse(forward_image(), media_type=content_type)
+
 
 if __name__ == "__main__":
     import uvicorn
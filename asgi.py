@@ -0,0 +1,2 @@
+# ASGI entry point: uvicorn asgi:app
+from api import app  # noqa: F401
@@ -0,0 +1,92 @@
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import redis
+from redis import asyncio as aioredis
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+
+REDIS_URL = 'redis://localhost:6379/0'
+
+CACHE_PREFIX = "avtomatik"
+
+# Namespaces of cached API responses that depend on the product catalog
+CATALOG_NAMESPACES = ("products", "stats", "brands", "stores")
+
+# Arguments that are injected per request and must not be part of a cache key
+IGNORED_KEY_ARGS = {"db", "request", "response"}
+
+IMAGE_CACHE_TTL = 24 * 60 * 60
+
+logger = logging.getLogger(__name__)
+
+redis_client: Optional[aioredis.Redis] = None
+
+
+def init_cache():
+    """Connect the response cache to Redis. Called once on API startup."""
+    global redis_client
+    redis_client = aioredis.from_url(REDIS_URL)
+    FastAPICache.init(RedisBackend(redis_client), prefix=CACHE_PREFIX)
+
+
+def query_key_builder(
+        func: Callable,
+        namespace: str = "",
+        request: Any = None,
+        response: Any = None,
+        args: Tuple[Any, ...] = (),
+        kwargs: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Build a cache key from the function and its query parameters, ignoring the DB session.
+    Cached functions must be called with keyword arguments only; positional ones would not
+    be part of the key and different calls would share a cached value.
+    """
+    if args:
+        raise TypeError(f"{func.__name__} is cached and must be called with keyword arguments")
+    params = sorted((key, value) for key, value in (kwargs or {}).items() if key not in IGNORED_KEY_ARGS)
+    digest = hashlib.md5(f"{func.__module__}:{func.__name__}:{params}".encode()).hexdigest()
+    return f"{FastAPICache.get_prefix()}:{namespace}:{digest}"
+
+
+def clear_catalog_cache():
+    """
+    Drop all cached catalog responses. Used by the import scripts after writing new data.
+    Redis being unavailable is not an import failure; the cached responses then expire on their own.
+    """
+    client = redis.Redis.from_url(REDIS_URL)
+    try:
+        for namespace in CATALOG_NAMESPACES:
+            for key in client.scan_iter(f"{CACHE_PREFIX}:{namespace}:*"):
+                client.delete(key)
+    except redis.RedisError as e:
+        logger.warning(f"Could not clear the catalog cache: {e}")
+    finally:
+        client.close()
+
+
+def _image_key(url: str) -> str:
+    return f"{CACHE_PREFIX}:images:{hashlib.sha1(url.encode()).hexdigest()}"
+
+
+async def get_cached_image(url: str) -> Optional[Tuple[bytes, str]]:
+    """Return the cached (content, content_type) of a proxied image, if any"""
+    if redis_client is None:
+        return None
+    cached = await redis_client.hgetall(_image_key(url))
+    if not cached:
+        return None
+    return cached[b"content"], cached[b"content_type"].decode()
+
+
+async def set_cached_image(url: str, content: bytes, content_type: str):
+    """Cache a proxied image for IMAGE_CACHE_TTL seconds"""
+    if redis_client is None:
+        return
+    key = _image_key(url)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={"content": content, "content_type": content_type})
+        pipe.expire(key, IMAGE_CACHE_TTL)
+        await pipe.execute()
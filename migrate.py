@@ -0,0 +1,162 @@
+"""
+Upgrade an existing database to the current models.
+
+Base.metadata.create_all only creates missing tables and never alters existing ones,
+so databases created before the schema changes below need this script once:
+
+- String(36) ids -> native PostgreSQL uuid (products, stores, pricing)
+- one product per brand+model and one price per product+store, as unique keys
+  for the import upserts (existing duplicates are merged first)
+- generated brand_norm / model_norm / search_vec columns and the feature_mask column
+- the pg_trgm extension and the listing, filter and search indexes
+
+Every statement is idempotent, so running it again on an upgraded database is a no-op.
+
+Usage: python migrate.py
+"""
+import logging
+
+from database import engine
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+UPGRADE_STATEMENTS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+
+    # String(36) ids -> uuid. The foreign keys have to be dropped while the
+    # referenced and referencing columns have different types.
+    """
+    DO $$
+    DECLARE
+        fk record;
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND ((table_name IN ('products', 'stores') AND column_name = 'id')
+                   OR (table_name = 'pricing' AND column_name IN ('id', 'product_id', 'store_id')))
+              AND data_type <> 'uuid'
+        ) THEN
+            FOR fk IN
+                SELECT conname FROM pg_constraint
+                WHERE conrelid = 'pricing'::regclass AND contype = 'f'
+            LOOP
+                EXECUTE format('ALTER TABLE pricing DROP CONSTRAINT %I', fk.conname);
+            END LOOP;
+
+            ALTER TABLE products ALTER COLUMN id TYPE uuid USING id::uuid;
+            ALTER TABLE stores ALTER COLUMN id TYPE uuid USING id::uuid;
+            ALTER TABLE pricing
+                ALTER COLUMN id TYPE uuid USING id::uuid,
+                ALTER COLUMN product_id TYPE uuid USING product_id::uuid,
+                ALTER COLUMN store_id TYPE uuid USING store_id::uuid;
+
+            ALTER TABLE pricing
+                ADD CONSTRAINT pricing_product_id_fkey FOREIGN KEY (product_id) REFERENCES products (id),
+                ADD CONSTRAINT pricing_store_id_fkey FOREIGN KEY (store_id) REFERENCES stores (id);
+        END IF;
+    END $$
+    """,
+
+    # Merge duplicate products (same recognized brand+model) into the oldest one
+    """
+    WITH ranked AS (
+        SELECT id, first_value(id) OVER (
+            PARTITION BY brand, model ORDER BY created_at NULLS LAST, id
+        ) AS keep_id
+        FROM products
+        WHERE brand <> 'Unknown' AND model <> 'Unknown'
+    )
+    UPDATE pricing SET product_id = ranked.keep_id
+    FROM ranked
+    WHERE pricing.product_id = ranked.id AND ranked.id <> ranked.keep_id
+    """,
+    """
+    DELETE FROM products
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY brand, model ORDER BY created_at NULLS LAST, id
+            ) AS rn
+            FROM products
+            WHERE brand <> 'Unknown' AND model <> 'Unknown'
+        ) ranked
+        WHERE rn > 1
+    )
+    """,
+
+    # Keep only the most recently updated price per product and store
+    """
+    DELETE FROM pricing
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY product_id, store_id ORDER BY last_updated DESC NULLS LAST, id DESC
+            ) AS rn
+            FROM pricing
+        ) ranked
+        WHERE rn > 1
+    )
+    """,
+
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_products_brand_model ON products (brand, model)
+    WHERE brand <> 'Unknown' AND model <> 'Unknown'
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_constraint
+            WHERE conrelid = 'pricing'::regclass AND conname = 'uq_pricing_product_store'
+        ) THEN
+            ALTER TABLE pricing ADD CONSTRAINT uq_pricing_product_store UNIQUE (product_id, store_id);
+        END IF;
+    END $$
+    """,
+
+    # New columns; feature_mask stays 0 until the next import recomputes it
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS feature_mask INTEGER NOT NULL DEFAULT 0",
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS brand_norm VARCHAR(100)
+    GENERATED ALWAYS AS (lower(brand)) STORED
+    """,
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS model_norm VARCHAR(100)
+    GENERATED ALWAYS AS (regexp_replace(upper(model), '[^A-Z0-9]', '', 'g')) STORED
+    """,
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vec TSVECTOR
+    GENERATED ALWAYS AS (
+        to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(brand, '') || ' ' || coalesce(model, ''))
+    ) STORED
+    """,
+
+    "CREATE INDEX IF NOT EXISTS ix_products_size ON products (size)",
+    "CREATE INDEX IF NOT EXISTS ix_products_resolution ON products (resolution)",
+    "CREATE INDEX IF NOT EXISTS ix_products_refresh_rate ON products (refresh_rate)",
+    "CREATE INDEX IF NOT EXISTS ix_products_panel_type ON products (panel_type)",
+    "CREATE INDEX IF NOT EXISTS ix_products_created_id ON products (created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_products_size_refresh ON products (size, refresh_rate)",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_brand_trgm ON products USING gin (brand gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_model_trgm ON products USING gin (model gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vec ON products USING gin (search_vec)",
+    "CREATE INDEX IF NOT EXISTS ix_pricing_product_price ON pricing (product_id, price)",
+]
+
+
+def migrate():
+    """Apply the upgrade in a single transaction."""
+    with engine.begin() as connection:
+        for statement in UPGRADE_STATEMENTS:
+            connection.exec_driver_sql(statement)
+    logger.info("Database schema is up to date")
+
+
+if __name__ == "__main__":
+    migrate()
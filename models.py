@@ -1,30 +1,69 @@
-from sqlalchemy import Column, String, Float, DateTime, ForeignKey, JSON, Text, func
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, JSON, Text, Index, UniqueConstraint, Computed, DDL, event, func, text
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.ext.declarative import declarative_base
+import os
 import uuid
 
 from database import Base
 
+# STRICT_LAZY=1 makes any relationship access that would emit a lazy load
+# raise instead, so N+1 query regressions surface during development
+LAZY_LOADING = "raise_on_sql" if os.getenv("STRICT_LAZY") == "1" else "select"
+
+# Trigram indexes below need the pg_trgm extension
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 
 class Product(Base):
     __tablename__ = "products"
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(255), nullable=False)
     brand = Column(String(100), nullable=False, index=True)
     model = Column(String(100), nullable=False, index=True)
     category = Column(String(100), nullable=False)
     specs = Column(JSON, nullable=True)  # Store specs as JSON for flexibility
-    size = Column(Float, nullable=True)  # Display size in inches
-    resolution = Column(String(50), nullable=True)  # e.g., "1920x1080", "2560x1440"
-    refresh_rate = Column(Float, nullable=True)  # e.g., 60, 75, 144, 165
-    panel_type = Column(String(20), nullable=True)  # e.g., "IPS", "VA", "TN"
+    size = Column(Float, nullable=True, index=True)  # Display size in inches
+    resolution = Column(String(50), nullable=True, index=True)  # e.g., "1920x1080", "2560x1440"
+    refresh_rate = Column(Float, nullable=True, index=True)  # e.g., 60, 75, 144, 165
+    panel_type = Column(String(20), nullable=True, index=True)  # e.g., "IPS", "VA", "TN"
     image_url = Column(String(500), nullable=True)
+    # Boolean specs (curved, hdr, ...) as a bitmask, see FEATURE_BITS in product_matcher
+    feature_mask = Column(Integer, nullable=False, default=0, server_default=text("0"))
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    # Brand and model in the normalized form the product matcher compares
+    brand_norm = Column(String(100), Computed("lower(brand)", persisted=True))
+    model_norm = Column(String(100), Computed("regexp_replace(upper(model), '[^A-Z0-9]', '', 'g')", persisted=True))
+    # Full-text search document maintained by PostgreSQL; only used in filters, never loaded
+    search_vec = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(brand, '') || ' ' || coalesce(model, ''))",
+            persisted=True
+        )
+    ))
+
+    __table_args__ = (
+        # One product per recognized brand+model; also the conflict target of the import upsert
+        Index(
+            "uq_products_brand_model", "brand", "model", unique=True,
+            postgresql_where=text("brand <> 'Unknown' AND model <> 'Unknown'")
+        ),
+        # Serves the keyset pagination of /products/ (newest first)
+        Index("ix_products_created_id", created_at.desc(), id.desc()),
+        # Size range + refresh rate filters in /products/
+        Index("ix_products_size_refresh", "size", "refresh_rate"),
+        # Let the ILIKE '%term%' filters of /search/ use an index instead of a seq scan
+        Index("ix_products_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_products_brand_trgm", "brand", postgresql_using="gin", postgresql_ops={"brand": "gin_trgm_ops"}),
+        Index("ix_products_model_trgm", "model", postgresql_using="gin", postgresql_ops={"model": "gin_trgm_ops"}),
+        Index("ix_products_search_vec", "search_vec", postgresql_using="gin"),
+    )
 
     # Relationship with Pricing
-    pricing = relationship("Pricing", back_populates="product")
+    pricing = relationship("Pricing", back_populates="product", lazy=LAZY_LOADING)
 
     def __repr__(self):
         return f"<Product(name='{self.name}', brand='{self.brand}', model='{self.model}')>"
@@ -33,7 +72,7 @@ class Product(Base):
 class Store(Base):
     __tablename__ = "stores"
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(100), nullable=False)
     website = Column(String(255), nullable=False)
     created_at = Column(DateTime, default=func.now())
@@ -48,9 +87,9 @@ class Store(Base):
 class Pricing(Base):
     __tablename__ = "pricing"
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    product_id = Column(String(36), ForeignKey("products.id"), nullable=False)
-    store_id = Column(String(36), ForeignKey("stores.id"), nullable=False)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"), nullable=False)
+    store_id = Column(UUID(as_uuid=True), ForeignKey("stores.id"), nullable=False)
     price = Column(Float, nullable=False)  # Store price in MKD
     stock_status = Column(String(50), nullable=True)  # e.g., "In Stock", "Out of Stock", "Unknown"
     url = Column(String(500), nullable=False)  # URL to the product page
@@ -58,9 +97,16 @@ class Pricing(Base):
     original_json = Column(JSON, nullable=True)  # Original JSON data for reference
     last_updated = Column(DateTime, default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        # Serves the best-price lookups in /compare/
+        Index("ix_pricing_product_price", "product_id", "price"),
+        # One price per product and store; also the conflict target of the import upsert
+        UniqueConstraint("product_id", "store_id", name="uq_pricing_product_store"),
+    )
+
     # Relationships
-    product = relationship("Product", back_populates="pricing")
-    store = relationship("Store", back_populates="pricing")
+    product = relationship("Product", back_populates="pricing", lazy=LAZY_LOADING)
+    store = relationship("Store", back_populates="pricing", lazy=LAZY_LOADING)
 
     def __repr__(self):
         return f"<Pricing(product_id='{self.product_id}', store_id='{self.store_id}', price={self.price})>"
\ No newline at end of file
@@ -1,11 +1,13 @@
-import json
 import logging
+import mmap
 from typing import Dict, Any
 import os
 
+import orjson
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
+from cache import clear_catalog_cache
 from database import SessionLocal, engine, Base
 from models import Product, Store, Pricing
 from product_matcher import ProductMatcher
@@ -25,11 +27,13 @@ def load_json_file(file_path: str) -> Dict[str, Any]:
         return {}
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            logger.info(f"Successfully loaded JSON file: {file_path}")
-            return data
-    except json.JSONDecodeError as e:
+        # Parse straight from a read-only memory map; orjson takes the UTF-8 bytes as-is
+        with open(file_path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                data = orjson.loads(view)
+        logger.info(f"Successfully loaded JSON file: {file_path}")
+        return data
+    except orjson.JSONDecodeError as e:
         logger.error(f"JSON decode error in file {file_path}: {e}")
     except Exception as e:
         logger.error(f"Error loading JSON file {file_path}: {e}")
@@ -39,7 +43,7 @@ def load_json_file(file_path: str) -> Dict[str, Any]:
 
 def process_data():
     """Process the scraped data and populate the database."""
-    # Create database tables if they don't exist
+    # Create database tables if they don't exist (existing databases: run migrate.py first)
     Base.metadata.create_all(bind=engine)
 
     # Create a database session
@@ -47,7 +51,8 @@ def process_data():
 
     try:
         # Initialize product matcher
-        matcher = ProductMatcher(db)
+        # PARSE_WORKERS=N parses large feeds in N processes
+        matcher = ProductMatcher(db, parse_workers=int(os.getenv("PARSE_WORKERS", "0")) or None)
 
         # Load data from JSON files
         logger.info("Loading Anhoch data...")
@@ -69,13 +74,11 @@ def process_data():
         # Save products to database
         logger.info("Saving products to database...")
 
-        for product_data in anhoch_products:
-            product, pricing = matcher.save_product(product_data)
-            logger.debug(f"Saved Anhoch product: {product.brand} {product.model}")
+        saved = matcher.save_products(anhoch_products)
+        logger.info(f"Saved {saved} Anhoch prices")
 
-        for product_data in neptun_products:
-            product, pricing = matcher.save_product(product_data)
-            logger.debug(f"Saved Neptun product: {product.brand} {product.model}")
+        saved = matcher.save_products(neptun_products)
+        logger.info(f"Saved {saved} Neptun prices")
 
         # Find matches between products
         logger.info("Finding product matches...")
@@ -88,6 +91,9 @@ def process_data():
                 logger.info(
                     f"Matched: {match['product'].brand} {match['product'].model} in {match['store'].name} (score: {match['score']:.2f})")
 
+        # Cached API responses no longer reflect the catalog
+        clear_catalog_cache()
+
         logger.info("Data processing completed successfully")
 
     except Exception as e:
@@ -128,11 +134,12 @@ def analyze_database_stats():
             logger.info(f"  {store}: {count}")
 
         # Count products with multiple stores
-        multi_store_products = db.query(Product.id, func.count(Pricing.store_id)) \
-            .join(Pricing, Product.id == Pricing.product_id) \
-            .group_by(Product.id) \
-            .having(func.count(Pricing.store_id) > 1) \
-            .count()
+        multi_store_products = db.query(func.count()).select_from(
+            db.query(Pricing.product_id)
+            .group_by(Pricing.product_id)
+            .having(func.count() > 1)
+            .subquery()
+        ).scalar()
 
         logger.info(f"Products available in multiple stores: {multi_store_products}")
 
@@ -1,450 +1,789 @@
 import re
 import json
-from typing import Dict, List, Tuple, Set, Optional, Any
-import Levenshtein
-from sqlalchemy.orm import Session
+import uuid
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Set, Optional, Any
+import numpy as np
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein as RapidLevenshtein
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, selectinload
 
 from models import Product, Store, Pricing
 
 
-class ProductMatcher:
-    def __init__(self, db_session: Session):
-        self.db = db_session
+_NONALNUM = re.compile(r'[^A-Z0-9]')
 
-        # Common monitor brands for quick lookups
-        self.known_brands = {
-            "lg", "samsung", "dell", "aoc", "benq", "asus", "msi", "xiaomi",
-            "philips", "acer", "viewsonic", "hp", "lenovo", "gigabyte", "fuego"
-        }
 
-        # Common display panel types
-        self.panel_types = {"ips", "va", "tn", "oled", "qd-oled", "nano ips"}
-
-        # Common resolution identifiers
-        self.resolution_patterns = {
-            "fhd": "1920x1080",
-            "full hd": "1920x1080",
-            "1080p": "1920x1080",
-            "wqhd": "2560x1440",
-            "qhd": "2560x1440",
-            "1440p": "2560x1440",
-            "2k": "2560x1440",
-            "4k": "3840x2160",
-            "uhd": "3840x2160",
-            "uwqhd": "3440x1440",
-            "ultrawide qhd": "3440x1440",
-            "5k": "5120x2880"
-        }
+def _normalize_model(model: str) -> str:
+    """Normalize a model number for comparison: uppercase, alphanumeric only."""
+    return _NONALNUM.sub('', model.upper())
 
-    def process_anhoch_data(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Process Anhoch product data and extract structured data."""
-        processed_products = []
 
-        # Create or get store
-        store = self._get_or_create_store("Anhoch", "https://www.anhoch.com")
+def _normalized_model_similarity(model1_norm: str, model2_norm: str) -> float:
+    """Similarity of two normalized model numbers: 1 - Levenshtein distance / longer length."""
+    if not model1_norm or not model2_norm:
+        return 0.0
+    return RapidLevenshtein.normalized_similarity(model1_norm, model2_norm)
 
-        for item in data.get("products", []):
-            # Extract product attributes
-            processed_product = self._parse_monitor_attributes(item["name"])
 
-            # Additional fields
-            processed_product["original_data"] = item
-            processed_product["price"] = self._extract_price(item["price"])
-            processed_product["stock_status"] = item.get("stock", "Unknown")
-            processed_product["url"] = item["url"]
-            processed_product["image_url"] = item["imageUrl"]
-            processed_product["store"] = store
+def _popcount(bits: int) -> int:
+    """Number of set bits (int.bit_count needs Python 3.10)."""
+    return bin(bits).count("1")
+
+
+@lru_cache(maxsize=65536)
+def _char_bitmap(model_norm: str) -> int:
+    """Set of the characters of a normalized model as a 64-bit mask; A-Z and 0-9 get distinct bits."""
+    bitmap = 0
+    for char in model_norm:
+        bitmap |= 1 << (ord(char) & 63)
+    return bitmap
+
+
+def _bounded_model_similarity(model1_norm: str, model2_norm: str, score_cutoff: float) -> float:
+    """
+    Like _normalized_model_similarity, but returns 0.0 for pairs below score_cutoff.
+    Every character of one model that is missing from the other needs at least one edit,
+    so the character bitmaps rule out most pairs before any distance is computed.
+    """
+    if model1_norm and model2_norm:
+        bitmap1 = _char_bitmap(model1_norm)
+        bitmap2 = _char_bitmap(model2_norm)
+        min_distance = max(_popcount(bitmap1 & ~bitmap2), _popcount(bitmap2 & ~bitmap1))
+        if 1 - min_distance / max(len(model1_norm), len(model2_norm)) < score_cutoff:
+            return 0.0
+
+    # Compare here rather than passing score_cutoff: rapidfuzz reports 0.0 for scores within
+    # about 1e-8 of the cutoff, which would drop pairs landing exactly on the threshold
+    similarity = _normalized_model_similarity(model1_norm, model2_norm)
+    return similarity if similarity >= score_cutoff else 0.0
+
+
+_PRICE_STRIP = re.compile(r'[^\d,.]')
+_REMOVE_DOTS = str.maketrans('', '', '.')
+
+
+@lru_cache(maxsize=4096)
+def _parse_price(price_str: str) -> float:
+    """Parse a store price string. Cached because many feed items share the same price."""
+    # Remove non-numeric characters except for decimal separators
+    price_clean = _PRICE_STRIP.sub('', price_str)
+
+    # Handle Macedonian price format (9.280,00)
+    if ',' in price_clean:
+        if '.' in price_clean:
+            # If both ',' and '.' exist, assume European format and drop the thousand separators
+            price_clean = price_clean.translate(_REMOVE_DOTS)
+        # The ',' is the decimal separator
+        price_clean = price_clean.replace(',', '.')
+
+    # Try to convert to float
+    try:
+        return float(price_clean)
+    except ValueError:
+        return 0.0
+
+
+# Patterns used by ProductMatcher._parse_monitor_attributes, compiled once per process
+_SIZE_RE = re.compile(r'(\d{1,2}(?:\.\d)?)["\']|\b(\d{1,2}(?:\.\d)?)\s*(?:inch|инч)')
+_SPECIFIC_RES_RE = re.compile(r'(\d{3,4}x\d{3,4})')
+_REFRESH_RE = re.compile(r'(\d{2,3})(?:\s*)hz')
+
+# Dell pattern: P2425H, SE2422H, U2724DE
+_DELL_RE = re.compile(r'\b([A-Z]+\d{3,4}[A-Z]{0,2}(?:-[A-Z0-9]+)?)\b')
+# Samsung pattern: LS27C360EAUXEN, LF24T450FQRXEN
+_SAMSUNG_RE = re.compile(r'\b(L[SCFT]\d{2}[A-Z]\d{3}[A-Z]+)\b')
+# LG pattern: 24GQ50F-B, 27MP60GP-B
+_LG_RE = re.compile(r'\b(\d{2}[A-Z]{2,}\d{2,}[A-Z]{0,2}-[A-Z0-9]+)\b')
+
+# Fallback model patterns, tried in order
+_MODEL_RES = [
+    re.compile(r'\b([A-Z0-9]{2,}[-_][A-Z0-9]{2,}[-_]?[A-Z0-9]*)\b', re.IGNORECASE),  # Format: XX-XX, XX-XX-XX
+    re.compile(r'\b([A-Z]\d{4}[A-Z]*)\b', re.IGNORECASE),  # Format: X9999X
+    re.compile(r'\b(\d{2}[A-Z]\d{2,}[A-Z0-9]+)\b', re.IGNORECASE),  # Format: 99X99XXX
+]
+
+
+def _alternation(keywords) -> str:
+    """Build a regex alternation of literal keywords, longest first."""
+    return '|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))
+
+
+# Common monitor brands for quick lookups
+KNOWN_BRANDS = {
+    "lg", "samsung", "dell", "aoc", "benq", "asus", "msi", "xiaomi",
+    "philips", "acer", "viewsonic", "hp", "lenovo", "gigabyte", "fuego"
+}
+
+# Display names of the brands; acronyms are kept uppercase
+_BRAND_CASING = {
+    brand: brand.upper() if brand in ["lg", "hp", "msi", "aoc"] else brand.capitalize()
+    for brand in KNOWN_BRANDS
+}
+
+# Generic "<brand> <model>" patterns, one per known brand. Note they are searched in the
+# lowercased name without IGNORECASE, so the model classes only match digits there.
+_GENERIC_MODEL_RES = {
+    brand: re.compile(r'\b' + re.escape(brand) + r'[^\w]*([A-Z0-9]+-?[A-Z0-9]+(?:-[A-Z0-9]+)?)\b')
+    for brand in KNOWN_BRANDS
+}
+
+# Common display panel types
+PANEL_TYPES = {"ips", "va", "tn", "oled", "qd-oled", "nano ips"}
+
+# Common resolution identifiers
+RESOLUTION_PATTERNS = {
+    "fhd": "1920x1080",
+    "full hd": "1920x1080",
+    "1080p": "1920x1080",
+    "wqhd": "2560x1440",
+    "qhd": "2560x1440",
+    "1440p": "2560x1440",
+    "2k": "2560x1440",
+    "4k": "3840x2160",
+    "uhd": "3840x2160",
+    "uwqhd": "3440x1440",
+    "ultrawide qhd": "3440x1440",
+    "5k": "5120x2880"
+}
+
+# Keywords that mark the boolean specs, by the spec they set
+FEATURE_KEYWORDS = {
+    "curved": "curved",
+    "gaming": "gaming",
+    "game": "gaming",
+    "hdr": "hdr",
+    "freesync": "freesync",
+    "g-sync": "gsync",
+    "gsync": "gsync",
+    "usb-c": "usb_c",
+    "usbc": "usb_c",
+    "hdmi": "hdmi",
+    "dp": "displayport",
+    "displayport": "displayport",
+    "speaker": "speakers",
+    "height": "height_adjustable",
+    "has": "height_adjustable",
+}
+
+# Bit of each boolean spec in feature_mask
+FEATURE_BITS = {
+    "curved": 1 << 0,
+    "gaming": 1 << 1,
+    "hdr": 1 << 2,
+    "freesync": 1 << 3,
+    "gsync": 1 << 4,
+    "usb_c": 1 << 5,
+    "hdmi": 1 << 6,
+    "displayport": 1 << 7,
+    "speakers": 1 << 8,
+    "height_adjustable": 1 << 9,
+}
+
+# One alternation per keyword set so each name is scanned once per category.
+# Longer keywords come first so e.g. "uwqhd" wins over "wqhd" and "qd-oled" over "oled".
+_BRAND_RE = re.compile(r'\b(' + _alternation(KNOWN_BRANDS) + r')\b')
+_RESOLUTION_RE = re.compile(_alternation(RESOLUTION_PATTERNS))
+_PANEL_RE = re.compile(_alternation(PANEL_TYPES))
+# Lookahead so overlapping keywords are all reported
+_FEATURE_RE = re.compile(r'(?=(' + _alternation(FEATURE_KEYWORDS) + r'))')
+
+
+@lru_cache(maxsize=65536)
+def _parse_name(product_name: str) -> Tuple:
+    """
+    Extract structured data from a monitor product name as an immutable tuple of
+    (name, brand, normalized brand, model, normalized model, size, resolution, refresh rate,
+    panel type, spec items, feature mask).
+    Cached because the same names are parsed on every import and matching run.
+    """
+    product_name = product_name.strip()
+    result = {
+        "name": product_name,
+        "brand": None,
+        "brand_norm": None,
+        "model": None,
+        "size": None,
+        "resolution": None,
+        "refresh_rate": None,
+        "panel_type": None,
+        "specs": {},
+    }
+
+    # Convert to lowercase for processing but preserve original case
+    name_lower = product_name.lower()
+
+    # Extract size (typically in format: XX" or XX-inch)
+    size_match = _SIZE_RE.search(name_lower)
+    if size_match:
+        size_value = size_match.group(1) if size_match.group(1) else size_match.group(2)
+        if size_value:
+            result["size"] = float(size_value)
+            result["specs"]["size"] = float(size_value)
+
+    # Extract brand (whole words only to avoid partial matches)
+    brand_match = _BRAND_RE.search(name_lower)
+    if brand_match:
+        brand = brand_match.group(1)
+        result["brand"] = _BRAND_CASING[brand]
+        result["brand_norm"] = brand
+
+    # Extract model number - look for patterns like specific formats
+    # Dell model pattern
+    if result["brand"] and result["brand"].lower() == "dell":
+        dell_model = _DELL_RE.search(product_name)
+        if dell_model:
+            result["model"] = dell_model.group(1)
+
+    # Samsung model pattern
+    elif result["brand"] and result["brand"].lower() == "samsung":
+        samsung_model = _SAMSUNG_RE.search(product_name)
+        if samsung_model:
+            result["model"] = samsung_model.group(1)
+
+    # LG model pattern
+    elif result["brand"] and result["brand"].lower() == "lg":
+        lg_model = _LG_RE.search(product_name)
+        if lg_model:
+            result["model"] = lg_model.group(1)
+
+    # Generic model pattern for other brands
+    if not result["model"] and result["brand"]:
+        # Look for alphanumeric pattern after brand name
+        generic_model = _GENERIC_MODEL_RES[result["brand_norm"]].search(name_lower)
+        if generic_model:
+            result["model"] = generic_model.group(1).upper()
+
+    # If model still not found, look for common model patterns
+    if not result["model"]:
+        # Look for patterns like: XXX-XXX, XXXXXXXX, etc.
+        for pattern in _MODEL_RES:
+            match = pattern.search(product_name)
+            if match:
+                result["model"] = match.group(1).upper()
+                break
+
+    # Extract resolution
+    res_match = _RESOLUTION_RE.search(name_lower)
+    if res_match:
+        res_value = RESOLUTION_PATTERNS[res_match.group(0)]
+        result["resolution"] = res_value
+        result["specs"]["resolution"] = res_value
+
+    # Extract specific resolution if mentioned in format like 1920x1080
+    specific_res = _SPECIFIC_RES_RE.search(name_lower)
+    if specific_res:
+        result["resolution"] = specific_res.group(1)
+        result["specs"]["resolution"] = specific_res.group(1)
+
+    # Extract refresh rate (typically in format: XXHz or XX Hz)
+    refresh_match = _REFRESH_RE.search(name_lower)
+    if refresh_match:
+        result["refresh_rate"] = float(refresh_match.group(1))
+        result["specs"]["refresh_rate"] = float(refresh_match.group(1))
+
+    # Extract panel type
+    panel_match = _PANEL_RE.search(name_lower)
+    if panel_match:
+        result["panel_type"] = panel_match.group(0).upper()
+        result["specs"]["panel_type"] = result["panel_type"]
+
+    # Extract additional specs; findall returns the matched keywords without building match objects
+    specs = result["specs"]
+    feature_mask = 0
+    for keyword in _FEATURE_RE.findall(name_lower):
+        feature = FEATURE_KEYWORDS[keyword]
+        specs[feature] = True
+        feature_mask |= FEATURE_BITS[feature]
+
+    model_norm = _normalize_model(result["model"]) if result["model"] else None
+
+    return (
+        result["name"], result["brand"], result["brand_norm"], result["model"], model_norm, result["size"],
+        result["resolution"], result["refresh_rate"], result["panel_type"], tuple(result["specs"].items()),
+        feature_mask,
+    )
+
+
+class ParsedProduct:
+    """
+    A monitor parsed from a store feed item or an unmatched pricing entry. The store
+    fields are filled in by the caller after parsing the name. Declares __slots__ by hand
+    (dataclass(slots=True) needs Python 3.10).
+    """
+    __slots__ = (
+        "name", "brand", "brand_norm", "model", "model_norm", "size", "resolution", "refresh_rate",
+        "panel_type", "specs", "feature_mask", "price", "stock_status", "url", "image_url", "store",
+        "original_data",
+    )
+
+    def __init__(
+            self,
+            name: str,
+            brand: Optional[str] = None,
+            brand_norm: Optional[str] = None,
+            model: Optional[str] = None,
+            model_norm: Optional[str] = None,
+            size: Optional[float] = None,
+            resolution: Optional[str] = None,
+            refresh_rate: Optional[float] = None,
+            panel_type: Optional[str] = None,
+            specs: Optional[Dict[str, Any]] = None,
+            feature_mask: int = 0,
+            price: float = 0.0,
+            stock_status: Optional[str] = None,
+            url: Optional[str] = None,
+            image_url: Optional[str] = None,
+            store: Optional[Store] = None,
+            original_data: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.brand = brand
+        self.brand_norm = brand_norm
+        self.model = model
+        self.model_norm = model_norm
+        self.size = size
+        self.resolution = resolution
+        self.refresh_rate = refresh_rate
+        self.panel_type = panel_type
+        self.specs = specs if specs is not None else {}
+        self.feature_mask = feature_mask
+        self.price = price
+        self.stock_status = stock_status
+        self.url = url
+        self.image_url = image_url
+        self.store = store
+        self.original_data = original_data
+
+    def __repr__(self):
+        return f"<ParsedProduct(name='{self.name}', brand='{self.brand}', model='{self.model}')>"
+
+
+def _to_parsed_product(parsed_name: Tuple) -> ParsedProduct:
+    """Build a ParsedProduct from the cached _parse_name tuple."""
+    (name, brand, brand_norm, model, model_norm, size,
+     resolution, refresh_rate, panel_type, specs, feature_mask) = parsed_name
+    return ParsedProduct(
+        name=name,
+        brand=brand,
+        brand_norm=brand_norm,
+        model=model,
+        model_norm=model_norm,
+        size=size,
+        resolution=resolution,
+        refresh_rate=refresh_rate,
+        panel_type=panel_type,
+        specs=dict(specs),
+        feature_mask=feature_mask,
+    )
+
+
+# Feeds smaller than this are parsed in-process even with parse workers; starting
+# the pool costs more than parsing a few thousand names
+PARALLEL_PARSE_MIN_ITEMS = 5000
+
 
-            processed_products.append(processed_product)
+class ProductMatcher:
+    def __init__(self, db_session: Session, parse_workers: Optional[int] = None):
+        self.db = db_session
+
+        # Number of processes used to parse large feeds; None parses in-process
+        self.parse_workers = parse_workers
 
-        return processed_products
+        # Stores resolved during this run, by name
+        self._store_cache: Dict[str, Store] = {}
+
+    def process_anhoch_data(self, data: Dict[str, Any]) -> List[ParsedProduct]:
+        """Process Anhoch product data and extract structured data."""
+        return list(self._process_feed(data, "Anhoch", "https://www.anhoch.com"))
 
-    def process_neptun_data(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def process_neptun_data(self, data: Dict[str, Any]) -> List[ParsedProduct]:
         """Process Neptun product data and extract structured data."""
-        processed_products = []
+        return list(self._process_feed(data, "Neptun", "https://www.neptun.mk"))
 
+    def _process_feed(self, data: Dict[str, Any], store_name: str, store_url: str) -> Iterator[ParsedProduct]:
+        """Yield the structured data of every product in a scraped store feed."""
         # Create or get store
-        store = self._get_or_create_store("Neptun", "https://www.neptun.mk")
+        store = self._get_or_create_store(store_name, store_url)
+
+        items = data.get("products", [])
+
+        # Parsing names is pure and CPU bound, so large feeds can be spread over processes
+        if self.parse_workers and len(items) >= PARALLEL_PARSE_MIN_ITEMS:
+            with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+                parsed_names = list(executor.map(_parse_name, [item["name"] for item in items], chunksize=256))
+        else:
+            parsed_names = map(_parse_name, (item["name"] for item in items))
+
+        # Bound once, called for every item
+        extract_price = self._extract_price
 
-        for item in data.get("products", []):
+        for item, parsed_name in zip(items, parsed_names):
             # Extract product attributes
-            processed_product = self._parse_monitor_attributes(item["name"])
+            processed_product = _to_parsed_product(parsed_name)
 
             # Additional fields
-            processed_product["original_data"] = item
-            processed_product["price"] = self._extract_price(item["price"])
-            processed_product["stock_status"] = item.get("stock", "Unknown")
-            processed_product["url"] = item["url"]
-            processed_product["image_url"] = item["imageUrl"]
-            processed_product["store"] = store
+            processed_product.original_data = item
+            processed_product.price = extract_price(item["price"])
+            processed_product.stock_status = item.get("stock", "Unknown")
+            processed_product.url = item["url"]
+            processed_product.image_url = item["imageUrl"]
+            processed_product.store = store
 
-            processed_products.append(processed_product)
-
-        return processed_products
+            yield processed_product
 
     def _get_or_create_store(self, name: str, website: str) -> Store:
-        """Get existing store or create a new one"""
-        store = self.db.query(Store).filter(Store.name == name).first()
-        if not store:
-            store = Store(name=name, website=website)
-            self.db.add(store)
-            self.db.commit()
+        """Get existing store or create a new one. New stores are committed with the products."""
+        store = self._store_cache.get(name)
+        if store is None:
+            store = self.db.query(Store).filter(Store.name == name).first()
+            if not store:
+                store = Store(name=name, website=website)
+                self.db.add(store)
+                # Assign the id now so pricing rows can reference it
+                self.db.flush()
+            self._store_cache[name] = store
         return store
 
-    def _parse_monitor_attributes(self, product_name: str) -> Dict[str, Any]:
+    def _parse_monitor_attributes(self, product_name: str) -> ParsedProduct:
         """Extract structured data from a monitor product name."""
-        product_name = product_name.strip()
-        result = {
-            "name": product_name,
-            "brand": None,
-            "model": None,
-            "size": None,
-            "resolution": None,
-            "refresh_rate": None,
-            "panel_type": None,
-            "specs": {},
-        }
-
-        # Convert to lowercase for processing but preserve original case
-        name_lower = product_name.lower()
-
-        # Extract size (typically in format: XX" or XX-inch)
-        size_match = re.search(r'(\d{1,2}(?:\.\d)?)["\']|\b(\d{1,2}(?:\.\d)?)\s*(?:inch|инч)', name_lower)
-        if size_match:
-            size_value = size_match.group(1) if size_match.group(1) else size_match.group(2)
-            if size_value:
-                result["size"] = float(size_value)
-                result["specs"]["size"] = float(size_value)
-
-        # Extract brand
-        for brand in self.known_brands:
-            if brand.lower() in name_lower:
-                # Use word boundaries to avoid partial matches
-                if re.search(r'\b' + re.escape(brand.lower()) + r'\b', name_lower):
-                    result["brand"] = brand.upper() if brand.lower() in ["lg", "hp", "msi", "aoc"] else brand.capitalize()
-                    break
-
-        # Extract model number - look for patterns like specific formats
-        # Dell pattern: P2425H, SE2422H, U2724DE
-        # Samsung pattern: LS27C360EAUXEN, LF24T450FQRXEN
-        # LG pattern: 24GQ50F-B, 27MP60GP-B
-
-        # Dell model pattern
-        if result["brand"] and result["brand"].lower() == "dell":
-            dell_model = re.search(r'\b([A-Z]+\d{3,4}[A-Z]{0,2}(?:-[A-Z0-9]+)?)\b', product_name)
-            if dell_model:
-                result["model"] = dell_model.group(1)
-
-        # Samsung model pattern
-        elif result["brand"] and result["brand"].lower() == "samsung":
-            samsung_model = re.search(r'\b(L[SCFT]\d{2}[A-Z]\d{3}[A-Z]+)\b', product_name)
-            if samsung_model:
-                result["model"] = samsung_model.group(1)
-
-        # LG model pattern
-        elif result["brand"] and result["brand"].lower() == "lg":
-            lg_model = re.search(r'\b(\d{2}[A-Z]{2,}\d{2,}[A-Z]{0,2}-[A-Z0-9]+)\b', product_name)
-            if lg_model:
-                result["model"] = lg_model.group(1)
-
-        # Generic model pattern for other brands
-        if not result["model"] and result["brand"]:
-            # Look for alphanumeric pattern after brand name
-            generic_model = re.search(
-                r'\b' + re.escape(result["brand"].lower()) + r'[^\w]*([A-Z0-9]+-?[A-Z0-9]+(?:-[A-Z0-9]+)?)\b',
-                name_lower
-            )
-            if generic_model:
-                result["model"] = generic_model.group(1).upper()
-
-        # If model still not found, look for common model patterns
-        if not result["model"]:
-            # Look for patterns like: XXX-XXX, XXXXXXXX, etc.
-            model_patterns = [
-                r'\b([A-Z0-9]{2,}[-_][A-Z0-9]{2,}[-_]?[A-Z0-9]*)\b',  # Format: XX-XX, XX-XX-XX
-                r'\b([A-Z]\d{4}[A-Z]*)\b',  # Format: X9999X
-                r'\b(\d{2}[A-Z]\d{2,}[A-Z0-9]+)\b',  # Format: 99X99XXX
-            ]
-
-            for pattern in model_patterns:
-                match = re.search(pattern, product_name, re.IGNORECASE)
-                if match:
-                    result["model"] = match.group(1).upper()
-                    break
-
-        # Extract resolution
-        for res_key, res_value in self.resolution_patterns.items():
-            if res_key in name_lower:
-                result["resolution"] = res_value
-                result["specs"]["resolution"] = res_value
-                break
-
-        # Extract specific resolution if mentioned in format like 1920x1080
-        specific_res = re.search(r'(\d{3,4}x\d{3,4})', name_lower)
-        if specific_res:
-            result["resolution"] = specific_res.group(1)
-            result["specs"]["resolution"] = specific_res.group(1)
-
-        # Extract refresh rate (typically in format: XXHz or XX Hz)
-        refresh_match = re.search(r'(\d{2,3})(?:\s*)hz', name_lower)
-        if refresh_match:
-            result["refresh_rate"] = float(refresh_match.group(1))
-            result["specs"]["refresh_rate"] = float(refresh_match.group(1))
-
-        # Extract panel type
-        for panel in self.panel_types:
-            if panel.lower() in name_lower:
-                result["panel_type"] = panel.upper() if panel.lower() in ["ips", "va", "tn"] else panel.upper()
-                result["specs"]["panel_type"] = result["panel_type"]
-                break
-
-        # Extract additional specs
-        additional_specs = {
-            "curved": "curved" in name_lower,
-            "gaming": "gaming" in name_lower or "game" in name_lower,
-            "hdr": "hdr" in name_lower,
-            "freesync": "freesync" in name_lower,
-            "gsync": "g-sync" in name_lower or "gsync" in name_lower,
-            "usb_c": "usb-c" in name_lower or "usbc" in name_lower,
-            "hdmi": "hdmi" in name_lower,
-            "displayport": "dp" in name_lower or "displayport" in name_lower,
-            "speakers": "speaker" in name_lower,
-            "height_adjustable": "height" in name_lower or "has" in name_lower,
-        }
-
-        # Add found specs to the specs dictionary
-        for key, value in additional_specs.items():
-            if value:
-                result["specs"][key] = value
-
-        return result
+        return _to_parsed_product(_parse_name(product_name))
 
     def _extract_price(self, price_str: str) -> float:
         """Extract numeric price from string formats like '9.280,00.' or '4.999.,00 den.'"""
-        # Remove non-numeric characters except for decimal separators
-        price_clean = re.sub(r'[^\d,.]', '', price_str)
-
-        # Handle Macedonian price format (9.280,00)
-        if ',' in price_clean and '.' in price_clean:
-            # If both ',' and '.' exist, assume European format
-            price_clean = price_clean.replace('.', '')  # Remove thousand separators
-            price_clean = price_clean.replace(',', '.')  # Convert decimal separator
-        elif ',' in price_clean:
-            # If only ',' exists, assume it's the decimal separator
-            price_clean = price_clean.replace(',', '.')
-
-        # Try to convert to float
-        try:
-            return float(price_clean)
-        except ValueError:
-            return 0.0
-
-    def save_product(self, product_data: Dict[str, Any]) -> Tuple[Product, Pricing]:
-        """Save a processed product to the database."""
-        # Check if product already exists by brand+model
-        existing_product = None
-        if product_data["brand"] and product_data["model"]:
-            existing_product = self.db.query(Product).filter(
-                Product.brand == product_data["brand"],
-                Product.model == product_data["model"]
-            ).first()
-
-        # If product doesn't exist, create it
-        if not existing_product:
-            new_product = Product(
-                name=product_data["name"],
-                brand=product_data["brand"] or "Unknown",
-                model=product_data["model"] or "Unknown",
-                category="Monitors",
-                specs=product_data["specs"],
-                size=product_data["size"],
-                resolution=product_data["resolution"],
-                refresh_rate=product_data["refresh_rate"],
-                panel_type=product_data["panel_type"],
-                image_url=product_data["image_url"]
+        return _parse_price(price_str)
+
+    def save_products(self, products_data: List[ParsedProduct], batch_size: int = 500) -> int:
+        """
+        Save processed products with batched INSERT ... ON CONFLICT statements instead of
+        a SELECT + INSERT per item, all in one transaction. Returns the number of pricing
+        rows written.
+        """
+        saved = 0
+        for start in range(0, len(products_data), batch_size):
+            batch = products_data[start:start + batch_size]
+            product_ids = self._upsert_products(batch)
+
+            # One price per product and store; the last one in the feed wins
+            pricing_rows = {}
+            for product_data, product_id in zip(batch, product_ids):
+                pricing_rows[(product_id, product_data.store.id)] = {
+                    "id": uuid.uuid4(),
+                    "product_id": product_id,
+                    "store_id": product_data.store.id,
+                    "price": product_data.price,
+                    "stock_status": product_data.stock_status,
+                    "url": product_data.url,
+                    "original_name": product_data.name,
+                    "original_json": product_data.original_data,
+                }
+
+            stmt = insert(Pricing).values(list(pricing_rows.values()))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Pricing.product_id, Pricing.store_id],
+                set_={
+                    "price": stmt.excluded.price,
+                    "stock_status": stmt.excluded.stock_status,
+                    "url": stmt.excluded.url,
+                    "original_name": stmt.excluded.original_name,
+                    "original_json": stmt.excluded.original_json,
+                    "last_updated": func.now(),
+                }
             )
-            self.db.add(new_product)
-            self.db.commit()
-            product = new_product
-        else:
-            product = existing_product
-
-        # Add pricing information
-        pricing = Pricing(
-            product_id=product.id,
-            store_id=product_data["store"].id,
-            price=product_data["price"],
-            stock_status=product_data["stock_status"],
-            url=product_data["url"],
-            original_name=product_data["name"],
-            original_json=product_data["original_data"]
-        )
-        self.db.add(pricing)
-        self.db.commit()
+            self.db.execute(stmt)
+            saved += len(pricing_rows)
 
-        return product, pricing
+        self.db.commit()
+        return saved
+
+    def _upsert_products(self, batch: List[ParsedProduct]) -> List[str]:
+        """Insert the new products of a batch and return the product id of every item."""
+        rows = {}
+        keys = []
+        for product_data in batch:
+            row = {
+                "id": uuid.uuid4(),
+                "name": product_data.name,
+                "brand": product_data.brand or "Unknown",
+                "model": product_data.model or "Unknown",
+                "category": "Monitors",
+                "specs": product_data.specs,
+                "feature_mask": product_data.feature_mask,
+                "size": product_data.size,
+                "resolution": product_data.resolution,
+                "refresh_rate": product_data.refresh_rate,
+                "panel_type": product_data.panel_type,
+                "image_url": product_data.image_url,
+            }
+            # Only reuse products whose brand and model were both recognized
+            if product_data.brand and product_data.model:
+                key = (row["brand"], row["model"])
+            else:
+                key = row["id"]
+            rows.setdefault(key, row)
+            keys.append(key)
+
+        # Existing products are kept as they are; the no-op update makes RETURNING include them
+        stmt = insert(Product).values(list(rows.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Product.brand, Product.model],
+            index_where=(Product.brand != "Unknown") & (Product.model != "Unknown"),
+            set_={"updated_at": func.now()}
+        ).returning(Product.id, Product.brand, Product.model)
+
+        product_ids = {}
+        for product_id, brand, model in self.db.execute(stmt):
+            product_ids[(brand, model)] = product_id
+            product_ids[product_id] = product_id
+
+        return [product_ids[key] for key in keys]
 
     def find_product_matches(self) -> List[Dict[str, Any]]:
         """Find matching products across different stores."""
         # Get all products without matches
-        products = self.db.query(Product).all()
+        products = self.db.query(Product).options(selectinload(Product.pricing)).all()
         stores = self.db.query(Store).all()
 
+        # Parse the unmatched pricing entries once and block them by brand and size
+        candidates = self._index_candidates()
+
+        # Stores each product is already listed in, from the eager-loaded pricing
+        product_stores = {
+            product.id: {pricing.store_id for pricing in product.pricing}
+            for product in products
+        }
+
         matches = []
+        new_pricings = []
 
         # For each product, find potential matches
         for product in products:
-            # Get current stores for this product
-            current_stores = set(pricing.store_id for pricing in product.pricing)
+            current_stores = product_stores[product.id]
 
             # Find stores where this product doesn't exist yet
             missing_stores = [store for store in stores if store.id not in current_stores]
 
             for store in missing_stores:
                 # Look for potential matches in this store
-                potential_matches = self._find_potential_matches(product, store)
+                potential_matches = self._find_potential_matches(product, store, candidates)
 
-                for match in potential_matches:
+                # Keep the best match per store; a product has one price per store
+                best_match, best_score = None, 0.0
+                for match, model_score in potential_matches:
                     # Calculate match score
-                    match_score = self._calculate_match_score(product, match)
-
-                    if match_score >= 0.8:  # 80% confidence threshold
-                        # Create a pricing entry linking the product to the store
-                        pricing = Pricing(
-                            product_id=product.id,
-                            store_id=store.id,
-                            price=match["price"],
-                            stock_status=match["stock_status"],
-                            url=match["url"],
-                            original_name=match["name"],
-                            original_json=match["original_data"]
-                        )
-                        self.db.add(pricing)
-
-                        matches.append({
-                            "product": product,
-                            "store": store,
-                            "match": match,
-                            "score": match_score
-                        })
-
+                    match_score = self._calculate_match_score(
+                        product, match, model_score, threshold=max(0.8, best_score)
+                    )
+
+                    if match_score >= 0.8 and match_score > best_score:  # 80% confidence threshold
+                        best_match, best_score = match, match_score
+
+                if best_match:
+                    # Create a pricing entry linking the product to the store
+                    pricing = Pricing(
+                        product_id=product.id,
+                        store_id=store.id,
+                        price=best_match.price,
+                        stock_status=best_match.stock_status,
+                        url=best_match.url,
+                        original_name=best_match.name,
+                        original_json=best_match.original_data
+                    )
+                    new_pricings.append(pricing)
+
+                    matches.append({
+                        "product": product,
+                        "store": store,
+                        "match": best_match,
+                        "score": best_score
+                    })
+
+        self.db.add_all(new_pricings)
         self.db.commit()
         return matches
 
-    def _find_potential_matches(self, product: Product, store: Store) -> List[Dict[str, Any]]:
-        """Find potential matches for a product in a specific store."""
-        # Get all pricing entries for the store
-        store_pricings = self.db.query(Pricing).filter(Pricing.store_id == store.id).all()
-
-        potential_matches = []
-
-        for pricing in store_pricings:
-            # Skip if already matched to a product
-            if pricing.product_id:
+    def _index_candidates(self) -> Dict[Any, Dict[str, Dict[Any, Any]]]:
+        """
+        Parse every unmatched pricing entry once and group them per store into blocks by
+        brand and by size. A candidate can only pass the brand/model check of
+        _find_potential_matches with the same brand, and the specs check with the same size,
+        so each product is compared against those two blocks instead of the whole store.
+
+        Brand blocks are (model lengths, normalized models, candidates), sorted by model
+        length, so the models a product can come close to are a contiguous slice.
+        """
+        index = defaultdict(lambda: {"brand": defaultdict(list), "size": defaultdict(list)})
+
+        unmatched = self.db.query(Pricing).filter(Pricing.product_id.is_(None)).all()
+        for pricing in unmatched:
+            # Only entries with the original data can be matched
+            if not pricing.original_json:
                 continue
 
-            # Process the original data if available
-            if pricing.original_json:
-                match_data = self._parse_monitor_attributes(pricing.original_name)
-                match_data["price"] = pricing.price
-                match_data["stock_status"] = pricing.stock_status
-                match_data["url"] = pricing.url
-                match_data["original_data"] = pricing.original_json
+            match_data = self._parse_monitor_attributes(pricing.original_name)
+            match_data.price = pricing.price
+            match_data.stock_status = pricing.stock_status
+            match_data.url = pricing.url
+            match_data.original_data = pricing.original_json
+
+            blocks = index[pricing.store_id]
+            if match_data.brand and match_data.model:
+                blocks["brand"][match_data.brand_norm].append(match_data)
+            if match_data.size:
+                blocks["size"][match_data.size].append(match_data)
+
+        for blocks in index.values():
+            for brand, entries in blocks["brand"].items():
+                entries.sort(key=lambda match_data: len(match_data.model_norm))
+                models = [match_data.model_norm for match_data in entries]
+                blocks["brand"][brand] = ([len(model) for model in models], models, entries)
+
+        return index
+
+    def _find_potential_matches(
+            self,
+            product: Product,
+            store: Store,
+            candidates: Dict[Any, Dict[str, Dict[Any, Any]]]
+    ) -> List[Tuple[ParsedProduct, Optional[float]]]:
+        """
+        Find potential matches for a product among the indexed candidates of a store.
+        Returns (match_data, model similarity) pairs; the similarity is only known for
+        brand/model matches, which are scored in bulk, and is None for specs matches.
+        """
+        blocks = candidates.get(store.id)
+        if not blocks:
+            return []
 
-                # Check for brand/model match
-                if (match_data["brand"] and match_data["brand"].lower() == product.brand.lower() and
-                        match_data["model"] and self._model_similarity(match_data["model"], product.model) >= 0.8):
-                    potential_matches.append(match_data)
+        potential_matches = []
 
-                # Check for size and specs match if no brand/model match
-                elif (match_data["size"] and product.size and match_data["size"] == product.size and
-                      self._specs_similarity(match_data["specs"], product.specs) >= 0.7):
-                    potential_matches.append(match_data)
+        # Check for brand/model match, scoring the brand block in one cdist call
+        same_brand = blocks["brand"].get(product.brand_norm)
+        product_model = product.model_norm
+        if same_brand and product_model:
+            lengths, models, entries = same_brand
+
+            # A similarity of 0.8 allows at most 20% of the longer model to differ, so only
+            # models between 4/5 and 5/4 of the product model's length can reach it
+            model_len = len(product_model)
+            lo = bisect_left(lengths, -(-4 * model_len // 5))
+            hi = bisect_right(lengths, 5 * model_len // 4)
+
+            if lo < hi:
+                scores = process.cdist(
+                    [product_model],
+                    models[lo:hi],
+                    scorer=RapidLevenshtein.normalized_similarity,
+                    # rapidfuzz reports scores within about 1e-8 of score_cutoff as 0, so cut a
+                    # little lower and apply the real 0.8 threshold below
+                    score_cutoff=0.8 - 1e-6,
+                    # Full precision, the scores are reused as the model component of the match score
+                    dtype=np.float64
+                )[0]
+                potential_matches.extend(
+                    (match_data, score) for match_data, score in zip(entries[lo:hi], scores) if score >= 0.8
+                )
+
+        # Check for size and specs match if no brand/model match
+        if product.size:
+            brand_matches = {id(match_data) for match_data, _ in potential_matches}
+            for match_data in blocks["size"].get(product.size, []):
+                if (id(match_data) not in brand_matches and
+                        self._specs_similarity(match_data, product) >= 0.7):
+                    potential_matches.append((match_data, None))
 
         return potential_matches
 
-    def _model_similarity(self, model1: str, model2: str) -> float:
-        """Calculate similarity between two model numbers using Levenshtein distance."""
-        if not model1 or not model2:
-            return 0.0
-
-        # Normalize models: uppercase and remove non-alphanumeric chars
-        model1_norm = re.sub(r'[^A-Z0-9]', '', model1.upper())
-        model2_norm = re.sub(r'[^A-Z0-9]', '', model2.upper())
-
-        if not model1_norm or not model2_norm:
+    def _specs_similarity(self, match_data: ParsedProduct, product: Product) -> float:
+        """Calculate similarity between the specs of a parsed product and a stored product."""
+        # Boolean specs are only recorded when present, so the ones both sides have
+        # are common keys that always match
+        common = matches = _popcount(match_data.feature_mask & (product.feature_mask or 0))
+
+        # Count matching values among the specs set on both sides
+        for value1, value2 in (
+                (match_data.size, product.size),
+                (match_data.resolution, product.resolution),
+                (match_data.refresh_rate, product.refresh_rate),
+                (match_data.panel_type, product.panel_type),
+        ):
+            if value1 is not None and value2 is not None:
+                common += 1
+                matches += value1 == value2
+
+        if not common:
             return 0.0
 
-        # Calculate Levenshtein distance
-        distance = Levenshtein.distance(model1_norm, model2_norm)
-        max_len = max(len(model1_norm), len(model2_norm))
-
-        # Return similarity score (1 - normalized distance)
-        return 1 - (distance / max_len)
-
-    def _specs_similarity(self, specs1: Dict[str, Any], specs2: Dict[str, Any]) -> float:
-        """Calculate similarity between two spec dictionaries."""
-        if not specs1 or not specs2:
-            return 0.0
-
-        # Convert specs to sets for comparison
-        keys1 = set(specs1.keys())
-        keys2 = set(specs2.keys())
-
-        # Check common keys
-        common_keys = keys1.intersection(keys2)
-
-        if not common_keys:
-            return 0.0
-
-        # Count matching values
-        matches = 0
-        for key in common_keys:
-            if specs1[key] == specs2[key]:
-                matches += 1
-
         # Calculate similarity score
-        return matches / len(common_keys)
-
-    def _calculate_match_score(self, product: Product, match_data: Dict[str, Any]) -> float:
-        """Calculate overall match score between a product and potential match."""
+        return matches / common
+
+    def _calculate_match_score(
+            self,
+            product: Product,
+            match_data: ParsedProduct,
+            model_similarity: Optional[float] = None,
+            threshold: float = 0.8
+    ) -> float:
+        """
+        Calculate overall match score between a product and potential match.
+        model_similarity can pass in an already computed similarity of the two models.
+        Returns 0.0 as soon as the score can no longer reach threshold.
+        """
+        # Cheap equality components first; the model similarity is computed last.
+        # Weights are in percent so the sums are exact.
         score_components = []
 
         # Brand match (25%)
-        if product.brand and match_data["brand"]:
-            brand_match = 1.0 if product.brand.lower() == match_data["brand"].lower() else 0.0
-            score_components.append((brand_match, 0.25))
-
-        # Model match (35%)
-        if product.model and match_data["model"]:
-            model_match = self._model_similarity(product.model, match_data["model"])
-            score_components.append((model_match, 0.35))
+        if product.brand and match_data.brand:
+            brand_match = 1.0 if product.brand_norm == match_data.brand_norm else 0.0
+            score_components.append((brand_match, 25))
 
         # Size match (15%)
-        if product.size and match_data["size"]:
-            size_match = 1.0 if product.size == match_data["size"] else 0.0
-            score_components.append((size_match, 0.15))
+        if product.size and match_data.size:
+            size_match = 1.0 if product.size == match_data.size else 0.0
+            score_components.append((size_match, 15))
 
         # Resolution match (10%)
-        if product.resolution and match_data["resolution"]:
-            res_match = 1.0 if product.resolution == match_data["resolution"] else 0.0
-            score_components.append((res_match, 0.10))
+        if product.resolution and match_data.resolution:
+            res_match = 1.0 if product.resolution == match_data.resolution else 0.0
+            score_components.append((res_match, 10))
 
         # Refresh rate match (10%)
-        if product.refresh_rate and match_data["refresh_rate"]:
-            rate_match = 1.0 if product.refresh_rate == match_data["refresh_rate"] else 0.0
-            score_components.append((rate_match, 0.10))
+        if product.refresh_rate and match_data.refresh_rate:
+            rate_match = 1.0 if product.refresh_rate == match_data.refresh_rate else 0.0
+            score_components.append((rate_match, 10))
 
         # Panel type match (5%)
-        if product.panel_type and match_data["panel_type"]:
-            panel_match = 1.0 if product.panel_type == match_data["panel_type"] else 0.0
-            score_components.append((panel_match, 0.05))
+        if product.panel_type and match_data.panel_type:
+            panel_match = 1.0 if product.panel_type == match_data.panel_type else 0.0
+            score_components.append((panel_match, 5))
 
-        # Calculate weighted score
-        if not score_components:
-            return 0.0
+        # Model match (35%)
+        has_model = bool(product.model and match_data.model)
 
-        weighted_score = sum(score * weight for score, weight in score_components)
-        total_weight = sum(weight for _, weight in score_components)
+        total_weight = sum(weight for _, weight in score_components) + (35 if has_model else 0)
+        if not total_weight:
+            return 0.0
 
-        return weighted_score / total_weight
\ No newline at end of file
+        # Stop once even perfect scores on the remaining components would stay below threshold
+        weighted_score = 0
+        remaining_weight = total_weight
+        for score, weight in score_components:
+            weighted_score += score * weight
+            remaining_weight -= weight
+            if weighted_score + remaining_weight < threshold * total_weight:
+                return 0.0
+
+        if has_model:
+            if model_similarity is None:
+                # Lowest model similarity that still reaches threshold (with a little slack for rounding)
+                needed = max(0.0, (threshold * total_weight - weighted_score) / 35 - 1e-9)
+                model_similarity = _bounded_model_similarity(product.model_norm, match_data.model_norm, needed)
+            weighted_score += model_similarity * 35
+
+        return weighted_score / total_weight
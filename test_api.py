@@ -0,0 +1,109 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+import api
+from models import Store
+
+
+class DriverUUID(uuid.UUID):
+    """Stands in for asyncpg.pgproto.pgproto.UUID, a uuid.UUID subclass"""
+
+
+STORE_ID = DriverUUID(int=1)
+PRODUCT_ID = DriverUUID(int=2)
+PRICING_ID = DriverUUID(int=3)
+CREATED_AT = datetime(2026, 10, 15, 21, 12, 30, 930976)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakeSession:
+    """Answers the product page query, then the pricing query, like asyncpg would"""
+
+    def __init__(self):
+        self.product_row = {
+            "id": PRODUCT_ID, "name": "Dell P2425H 24\" IPS", "brand": "Dell", "model": "P2425H",
+            "category": "Monitors", "specs": {"size": 24.0, "panel_type": "IPS"}, "size": 24.0,
+            "resolution": None, "refresh_rate": None, "panel_type": "IPS", "image_url": None,
+            "created_at": CREATED_AT,
+        }
+        self.pricing_row = {
+            "id": PRICING_ID, "product_id": PRODUCT_ID, "price": 9280.0, "stock_status": "In stock",
+            "url": "https://example.com/p2425h", "last_updated": CREATED_AT, "store_id": STORE_ID,
+        }
+
+    async def execute(self, stmt, params=None):
+        if stmt.get_final_froms()[0].name == "pricing":
+            return FakeResult([self.pricing_row])
+        return FakeResult([self.product_row])
+
+    async def scalars(self, stmt):
+        return [Store(id=STORE_ID, name="Anhoch", website="https://www.anhoch.com")]
+
+
+def setup_module():
+    FastAPICache.init(InMemoryBackend(), prefix="test")
+
+
+def list_first_page(db):
+    return api.list_products(
+        db=db, cursor=None, limit=1, brand=None, min_size=None, max_size=None,
+        min_refresh_rate=None, panel_type=None, resolution=None, in_stock=None
+    )
+
+
+def test_product_list_with_driver_uuids_serializes():
+    products, _ = asyncio.run(api.fetch_product_rows(FakeSession(), api.select(*api.PRODUCT_COLUMNS)))
+
+    body = orjson.loads(ORJSONResponse(products).body)
+
+    assert body[0]["id"] == str(PRODUCT_ID)
+    assert body[0]["prices"][0]["id"] == str(PRICING_ID)
+    assert body[0]["prices"][0]["store"]["id"] == str(STORE_ID)
+
+
+def test_cached_product_page_renders_like_a_fresh_one():
+    async def fetch_twice():
+        db = FakeSession()
+        return await list_first_page(db), await list_first_page(db)
+
+    miss, hit = asyncio.run(fetch_twice())
+
+    assert ORJSONResponse(hit["products"]).body == ORJSONResponse(miss["products"]).body
+    assert orjson.loads(ORJSONResponse(hit["products"]).body)[0]["prices"][0]["last_updated"] == \
+        CREATED_AT.isoformat()
+    assert hit["next_cursor"] == miss["next_cursor"]
+
+
+def test_paginated_endpoints_reject_an_empty_page_size():
+    client = TestClient(api.app)
+
+    assert client.get("/products/", params={"limit": 0}).status_code == 422
+    assert client.get("/products/multi-store/", params={"limit": 0}).status_code == 422
+
+
+def test_cross_origin_clients_can_read_the_next_cursor():
+    client = TestClient(api.app)
+
+    response = client.get("/", headers={"Origin": "https://example.com"})
+
+    assert "X-Next-Cursor" in response.headers["Access-Control-Expose-Headers"]
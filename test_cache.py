@@ -0,0 +1,18 @@
+import pytest
+
+import cache
+
+
+def test_clearing_the_catalog_cache_survives_redis_being_down(monkeypatch):
+    # Nothing listens on port 1
+    monkeypatch.setattr(cache, "REDIS_URL", "redis://localhost:1/0")
+
+    cache.clear_catalog_cache()
+
+
+def test_cache_keys_refuse_positional_arguments():
+    def list_things(*, db, page):
+        pass
+
+    with pytest.raises(TypeError):
+        cache.query_key_builder(list_things, "things", args=(None, 2), kwargs={})
@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+from product_matcher import ProductMatcher, _bounded_model_similarity
+
+matcher = ProductMatcher(None)
+
+
+def stored_product(name):
+    """A Product-like object with the columns the matcher reads, parsed from a name"""
+    parsed = matcher._parse_monitor_attributes(name)
+    return SimpleNamespace(
+        brand=parsed.brand, brand_norm=parsed.brand_norm, model=parsed.model, model_norm=parsed.model_norm,
+        size=parsed.size, resolution=parsed.resolution, refresh_rate=parsed.refresh_rate,
+        panel_type=parsed.panel_type, feature_mask=parsed.feature_mask,
+    )
+
+
+def test_bounded_model_similarity_keeps_scores_on_the_cutoff():
+    assert _bounded_model_similarity("P2425HE", "P2422H", 5 / 7) == 5 / 7
+    assert _bounded_model_similarity("P2425HE", "P2422H", 5 / 7 + 1e-6) == 0.0
+
+
+def test_match_score_exactly_on_the_threshold_passes():
+    # Brand and resolution match, panel differs, models are 5/7 similar: (25 + 25 + 10) / 75
+    product = stored_product("Dell P2425HE FHD IPS monitor")
+    candidate = matcher._parse_monitor_attributes("Dell P2422H FHD VA monitor")
+
+    assert matcher._calculate_match_score(product, candidate) >= 0.8
+
+
+def test_brand_block_keeps_models_exactly_four_fifths_similar():
+    product = stored_product("Dell P2422 monitor")
+    candidate = matcher._parse_monitor_attributes("Dell P2423 monitor")
+    candidates = {
+        "store": {"brand": {"dell": ([5], ["P2423"], [candidate])}, "size": {}},
+    }
+
+    matches = matcher._find_potential_matches(product, SimpleNamespace(id="store"), candidates)
+
+    assert matches == [(candidate, 0.8)]